@@ -1,27 +1,166 @@
-from typing import Dict, List, Tuple
+from functools import lru_cache
+from typing import Any, Dict, List, Sequence, Tuple
 import numpy as np
-import pandas as pd
 
 from .config import DEFAULT_SUMMARY_STATS, DEFAULT_STAGE_BOUNDS
 
+# Spatial summary stats supported by `summarize_array`, in output order.
+_SUMMARY_STATS = ("mean", "median", "min", "max", "std")
+
+def _quantiles_inplace(arr_flat: np.ndarray, qs: Sequence[float], n: int = None) -> np.ndarray:
+    """
+    Quantiles (linear interpolation, as np.percentile) via one O(n)
+    np.partition on the neighbouring ranks; partitions `arr_flat` in place.
+
+    `n` is the number of non-NaN values (default: all). np.partition orders
+    NaNs last, so they can stay in the array without being compacted out.
+    """
+    if n is None:
+        n = arr_flat.size
+    pos = np.asarray(qs, dtype=np.float64) * (n - 1)
+    lo = np.floor(pos).astype(np.intp)
+    hi = np.minimum(lo + 1, n - 1)
+    arr_flat.partition(np.unique(np.concatenate([lo, hi])))
+    return arr_flat[lo] + (arr_flat[hi] - arr_flat[lo]) * (pos - lo)
+
 def summarize_array(arr: np.ndarray, stats: List[str]) -> Dict[str, float]:
+    # One float64 copy serves as scratch for the in-place reductions; the
+    # caller's array is never modified.
+    mat = np.array(arr, dtype=np.float64).reshape(1, -1)
+    values = _summarize_rows(mat, list(stats))[0]
+    if np.isnan(values).all():
+        return {s: np.nan for s in stats}
+
+    by_stat = dict(zip(stats, values.tolist()))
+    return {s: by_stat[s] for s in _SUMMARY_STATS if s in by_stat}
+
+def summarize_band(arr: np.ndarray) -> Dict[str, float]:
+    """
+    Per-band QA statistics: mean, median, min, max, std, p10 and p90.
+
+    NaNs are dropped once up front; the three quantiles come from a single
+    np.partition on that private copy. Returns {} if no finite pixels.
+    """
     arr_flat = arr[np.isfinite(arr)].ravel()
     if arr_flat.size == 0:
-        return {s: np.nan for s in stats}
+        return {}
 
-    out = {}
-    if "mean" in stats:
-        out["mean"] = float(np.mean(arr_flat))
-    if "median" in stats:
-        out["median"] = float(np.median(arr_flat))
+    mean = arr_flat.mean()
+    dev = arr_flat - mean
+    np.multiply(dev, dev, out=dev)
+    p50, p10, p90 = _quantiles_inplace(arr_flat, [0.5, 0.1, 0.9])
+
+    return {
+        "mean": float(mean),
+        "median": float(p50),
+        "min": float(arr_flat.min()),
+        "max": float(arr_flat.max()),
+        "std": float(np.sqrt(dev.mean())),
+        "p10": float(p10),
+        "p90": float(p90),
+    }
+
+def _summarize_rows(mat: np.ndarray, stats: List[str]) -> np.ndarray:
+    """
+    Row-wise `summarize_array` over a (K, N) matrix, with NaN as missing.
+
+    `mat` is scratch space and is overwritten: NaNs are never compacted out
+    (NaN-skipping reductions and np.partition handle them in place), so no
+    copy of the matrix is made. Returns a (K, len(stats)) array; rows without
+    finite values and unknown stat names give NaN.
+    """
+    out = np.full((mat.shape[0], len(stats)), np.nan)
+    np.copyto(mat, np.nan, where=np.isinf(mat))
+    cnt = np.count_nonzero(~np.isnan(mat), axis=1)
+    rows = np.flatnonzero(cnt)
+    if rows.size == 0:
+        return out
+
+    res: Dict[str, np.ndarray] = {}
     if "min" in stats:
-        out["min"] = float(np.min(arr_flat))
+        res["min"] = np.fmin.reduce(mat, axis=1)
     if "max" in stats:
-        out["max"] = float(np.max(arr_flat))
-    if "std" in stats:
-        out["std"] = float(np.std(arr_flat))
+        res["max"] = np.fmax.reduce(mat, axis=1)
+    if "median" in stats:
+        median = np.full(mat.shape[0], np.nan)
+        for r in rows:
+            median[r] = _quantiles_inplace(mat[r], [0.5], n=cnt[r])[0]
+        res["median"] = median
+    if "mean" in stats or "std" in stats:
+        valid = ~np.isnan(mat)
+        np.copyto(mat, 0.0, where=~valid)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = mat.sum(axis=1) / cnt
+            res["mean"] = mean
+            if "std" in stats:
+                np.subtract(mat, mean[:, None], out=mat, where=valid)
+                np.multiply(mat, mat, out=mat, where=valid)
+                res["std"] = np.sqrt(mat.sum(axis=1) / cnt)
+
+    for j, stat in enumerate(stats):
+        if stat in res:
+            out[rows, j] = res[stat][rows]
     return out
 
+# Rows per cache block when streaming the time reduction.
+_ROW_BLOCK = 64
+
+def _nanmean_over_time(arr_list: List[np.ndarray]) -> np.ndarray:
+    """
+    Per-pixel mean over a list of equally shaped arrays, ignoring NaNs.
+
+    Equivalent to ``np.nanmean(np.stack(arr_list), axis=0)`` but streams over
+    the list with a running sum/count instead of building a (T, H, W) stack.
+    The sum/count are walked in blocks of `_ROW_BLOCK` rows, so each block
+    stays in cache while all T arrays are added into it.
+    """
+    shape = arr_list[0].shape
+    if any(arr.shape != shape for arr in arr_list):
+        # as np.stack would: blocks of smaller arrays must not broadcast
+        raise ValueError("all input arrays must have the same shape")
+
+    acc = np.zeros(shape, dtype=np.float64)
+    cnt = np.zeros(shape, dtype=np.int32)
+    for r0 in range(0, acc.shape[0], _ROW_BLOCK):
+        rows = slice(r0, r0 + _ROW_BLOCK)
+        acc_blk = acc[rows]
+        cnt_blk = cnt[rows]
+        for arr in arr_list:
+            blk = arr[rows]
+            valid = ~np.isnan(blk)
+            np.add(acc_blk, blk, out=acc_blk, where=valid)
+            cnt_blk += valid
+
+    return _finish_time_mean(acc, cnt)
+
+def _finish_time_mean(acc: np.ndarray, cnt: np.ndarray) -> np.ndarray:
+    """Turn a running sum/count into the mean, in place in `acc` (NaN if no data)."""
+    np.divide(acc, cnt, out=acc, where=cnt > 0)
+    acc[cnt == 0] = np.nan
+    return acc
+
+# Running time-mean state of one field: (index_name, stage) -> (sum, count).
+TimeMeanState = Dict[Tuple[str, str], Tuple[np.ndarray, np.ndarray]]
+
+def add_to_time_mean(state: TimeMeanState, index_name: str, stage: str, arr: np.ndarray) -> None:
+    """
+    Fold one snapshot's index array into the running NaN-skipping sum/count
+    of (index_name, stage), so snapshots can be dropped once added. Raises
+    ValueError if its shape differs from the arrays already added.
+    """
+    key = (index_name, stage)
+    if key not in state:
+        state[key] = (np.zeros(arr.shape, dtype=np.float64), np.zeros(arr.shape, dtype=np.int32))
+    acc, cnt = state[key]
+    if arr.shape != acc.shape:
+        raise ValueError(
+            f"{index_name} ({stage}): array of shape {arr.shape} does not match "
+            f"the accumulated shape {acc.shape}"
+        )
+    valid = ~np.isnan(arr)
+    np.add(acc, arr, out=acc, where=valid)
+    cnt += valid
+
 def stage_for_fraction(
     frac: float,
     stage_bounds: Dict[str, Tuple[float, float]] = DEFAULT_STAGE_BOUNDS,
@@ -31,6 +170,51 @@ def stage_for_fraction(
             return name
     return "other"
 
+def stage_indices_for_fractions(
+    fractions: Sequence[float],
+    stage_bounds: Dict[str, Tuple[float, float]] = DEFAULT_STAGE_BOUNDS,
+) -> np.ndarray:
+    """
+    Vectorized `stage_for_fraction`.
+
+    Returns, for each fraction, the position of its stage in
+    `list(stage_bounds)`, or -1 where no stage matches ("other").
+    Non-overlapping bounds use one binary search; overlapping bounds fall
+    back to `stage_for_fraction`, so the first matching stage still wins.
+    """
+    fracs = np.asarray(fractions, dtype=np.float64)
+    if not stage_bounds:
+        return np.full(len(fracs), -1, dtype=np.intp)
+
+    bounds = np.asarray(list(stage_bounds.values()), dtype=np.float64).reshape(-1, 2)
+    order = np.argsort(bounds[:, 0], kind="stable")
+    los = bounds[order, 0]
+    his = bounds[order, 1]
+
+    if np.any(los[1:] < his[:-1]):
+        stage_pos = {stage: s for s, stage in enumerate(stage_bounds)}
+        return np.array(
+            [stage_pos.get(stage_for_fraction(f, stage_bounds), -1) for f in fracs.tolist()],
+            dtype=np.intp,
+        )
+    pos = np.searchsorted(los, fracs, side="right") - 1
+    inside = (pos >= 0) & (fracs < his[np.clip(pos, 0, None)])
+    return np.where(inside, order[np.clip(pos, 0, None)], -1)
+
+@lru_cache(maxsize=32)
+def _feature_columns(
+    index_names: Tuple[str, ...],
+    stage_names: Tuple[str, ...],
+    summary_stats: Tuple[str, ...],
+) -> Tuple[str, ...]:
+    """Feature column names, index -> stage -> stat; built once per layout."""
+    return tuple(
+        f"{index_name}_{stage}_{stat}"
+        for index_name in index_names
+        for stage in stage_names
+        for stat in summary_stats
+    )
+
 def aggregate_field_indices(
     field_id: str,
     index_time_series: Dict[str, List[Dict]],
@@ -38,16 +222,21 @@ def aggregate_field_indices(
     season_end,
     summary_stats: List[str] = None,
     stage_bounds: Dict[str, Tuple[float, float]] = None,
-) -> pd.Series:
+) -> Dict[str, Any]:
     """
     index_time_series: dict index_name -> list of dicts:
         {"datetime": dt, "fraction": f, "array": arr_field}
-    Returns a pd.Series with columns like NDVI_early_mean, NDVI_mid_max, ...
+    Entries may also carry a precomputed "stage" name (for the same
+    `stage_bounds`), which is then used instead of the fraction.
+    Returns a flat dict (one feature row) with keys like NDVI_early_mean,
+    NDVI_mid_max, ...; build the DataFrame once from a list of these.
     """
     if summary_stats is None:
         summary_stats = DEFAULT_SUMMARY_STATS
     if stage_bounds is None:
         stage_bounds = DEFAULT_STAGE_BOUNDS
+    stage_names = list(stage_bounds.keys())
+    stage_pos = {stage: s for s, stage in enumerate(stage_names)}
 
     data = {
         "field_id": field_id,
@@ -55,33 +244,88 @@ def aggregate_field_indices(
         "season_end": season_end,
     }
 
-    for index_name, entries in index_time_series.items():
-        # group arrays by stage
-        stage_arrays = {stage: [] for stage in stage_bounds.keys()}
-        for e in entries:
-            f = e["fraction"]
-            arr = e["array"]
-            stage = stage_for_fraction(f, stage_bounds)
-            if stage in stage_arrays:
-                stage_arrays[stage].append(arr)
-
-        # compute stats per stage
-        for stage, arr_list in stage_arrays.items():
-            if not arr_list:
-                for stat in summary_stats:
-                    col = f"{index_name}_{stage}_{stat}"
-                    data[col] = float("nan")
-                continue
-
-            # combine all arrays in stage (stack, then aggregate)
-            stacked = np.stack(arr_list, axis=0)
-            # reduce over time and space (flatten)
-            # simple approach: average over time first, then stats over space
-            mean_over_time = np.nanmean(stacked, axis=0)
-            stats_dict = summarize_array(mean_over_time, summary_stats)
-
-            for stat, val in stats_dict.items():
-                col = f"{index_name}_{stage}_{stat}"
-                data[col] = val
-
-    return pd.Series(data)
+    # Reduce each (index, stage) over time first, then compute the spatial
+    # stats for all of them at once: means of equal shape are stacked into a
+    # (K, H*W) matrix and summarized with one row-wise reduction per stat.
+    index_names = list(index_time_series.keys())
+    means_by_shape: Dict[Tuple[int, ...], List[Tuple[int, int, np.ndarray]]] = {}
+
+    for i, entries in enumerate(index_time_series.values()):
+        # group arrays by stage (precomputed, or one binary search over all
+        # fractions)
+        stage_arrays: List[List[np.ndarray]] = [[] for _ in stage_names]
+        if all("stage" in e for e in entries):
+            stage_idx = [stage_pos.get(e["stage"], -1) for e in entries]
+        else:
+            stage_idx = stage_indices_for_fractions([e["fraction"] for e in entries], stage_bounds)
+        for e, s in zip(entries, stage_idx):
+            if s >= 0:
+                stage_arrays[s].append(e["array"])
+
+        # simple approach: average over time first, then stats over space
+        for s, arr_list in enumerate(stage_arrays):
+            if arr_list:
+                mean_over_time = _nanmean_over_time(arr_list)
+                means_by_shape.setdefault(mean_over_time.shape, []).append((i, s, mean_over_time))
+
+    return _feature_row(data, index_names, stage_names, summary_stats, means_by_shape)
+
+def aggregate_field_time_means(
+    field_id: str,
+    time_means: TimeMeanState,
+    index_names: List[str],
+    season_start,
+    season_end,
+    summary_stats: List[str] = None,
+    stage_bounds: Dict[str, Tuple[float, float]] = None,
+) -> Dict[str, Any]:
+    """
+    `aggregate_field_indices` for time means already accumulated with
+    `add_to_time_mean` (stage names as in `stage_bounds`; others are
+    ignored). Returns the same flat feature row, with a column group for
+    every name in `index_names`. The state is consumed.
+    """
+    if summary_stats is None:
+        summary_stats = DEFAULT_SUMMARY_STATS
+    if stage_bounds is None:
+        stage_bounds = DEFAULT_STAGE_BOUNDS
+    stage_names = list(stage_bounds.keys())
+
+    data = {
+        "field_id": field_id,
+        "season_start": season_start,
+        "season_end": season_end,
+    }
+
+    means_by_shape: Dict[Tuple[int, ...], List[Tuple[int, int, np.ndarray]]] = {}
+    for i, index_name in enumerate(index_names):
+        for s, stage in enumerate(stage_names):
+            if (index_name, stage) in time_means:
+                mean_over_time = _finish_time_mean(*time_means[(index_name, stage)])
+                means_by_shape.setdefault(mean_over_time.shape, []).append((i, s, mean_over_time))
+
+    return _feature_row(data, index_names, stage_names, summary_stats, means_by_shape)
+
+def _feature_row(
+    data: Dict[str, Any],
+    index_names: List[str],
+    stage_names: List[str],
+    summary_stats: List[str],
+    means_by_shape: Dict[Tuple[int, ...], List[Tuple[int, int, np.ndarray]]],
+) -> Dict[str, Any]:
+    """
+    Spatial stats of the (index, stage) time means, added to `data` as
+    index -> stage -> stat columns; missing pairs are NaN.
+    """
+    values = np.full((len(index_names), len(stage_names), len(summary_stats)), np.nan)
+    for group in means_by_shape.values():
+        mat = np.stack([m.ravel() for _, _, m in group], axis=0)
+        rows_i = [i for i, _, _ in group]
+        rows_s = [s for _, s, _ in group]
+        values[rows_i, rows_s] = _summarize_rows(mat, summary_stats)
+
+    # values is laid out index -> stage -> stat, as the column names are
+    cols = _feature_columns(tuple(index_names), tuple(stage_names), tuple(summary_stats))
+    data.update(zip(cols, values.ravel().tolist()))
+
+    return data
@@ -1,22 +1,37 @@
 from typing import Optional, List, Dict, Any, Union, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+import threading
 import numpy as np
 import pandas as pd
 import geopandas as gpd
 from tqdm import tqdm
 
-from .config import DEFAULT_INDICES, DEFAULT_FRACTIONS
+from .config import (
+    DEFAULT_INDICES,
+    DEFAULT_FRACTIONS,
+    DEFAULT_STAGE_BOUNDS,
+    DEFAULT_MAX_WORKERS,
+    DEFAULT_IO_WORKERS,
+)
 from .indices import compute_indices
-from .aggregation import aggregate_field_indices
+from .aggregation import (
+    TimeMeanState,
+    add_to_time_mean,
+    aggregate_field_time_means,
+    stage_indices_for_fractions,
+    summarize_band,
+)
 from .selection import (
+    SortedItems,
     select_snapshots_fractional,
     select_snapshot_fixed_date,
     select_top_n_cloudfree,
     select_snapshots_all,
     select_snapshots_by_dates,
 )
-from .sources.planetary_computer_source import PlanetaryComputerS2Source
-from .utils import gdf_to_bbox, clip_raster_to_geom
+from .sources.planetary_computer_source import CLOUD_COVER_ASC, PlanetaryComputerS2Source
+from .utils import gdf_to_bbox, read_item_windows, crop_to_geom
 
 
 class s2agc:
@@ -45,6 +60,7 @@ class s2agc:
         bands: Optional[List[str]] = None,
         stac_limit: int = 100,
         return_mode: str = "features",  # 'features', 'bands', 'both'
+        max_workers: Optional[int] = None,
     ) -> Union[pd.DataFrame, Tuple[pd.DataFrame, pd.DataFrame]]:
         """
         Main entry point: returns Sentinel-2 features for given season.
@@ -80,11 +96,17 @@ class s2agc:
         bands : list[str], optional
             Band codes to fetch (e.g. ["B02","B03"]); if None, all 'B*' assets are used.
         stac_limit : int
-            Max items from STAC search.
+            Max items from STAC search. For 'top_n_cloudfree' the search is
+            sorted by cloud cover server-side and limited to `n_snapshots`.
         return_mode : {'features', 'bands', 'both'}
             - 'features' (default): returns aggregated index features.
             - 'bands'            : returns per-band summary stats per snapshot.
             - 'both'             : returns (features_df, bands_df).
+        max_workers : int, optional
+            Number of snapshots processed concurrently; if None,
+            DEFAULT_MAX_WORKERS. Band files of all snapshots are opened and
+            read on one shared pool of DEFAULT_IO_WORKERS threads, so the
+            number of concurrent remote requests stays bounded.
 
         Returns
         -------
@@ -97,7 +119,13 @@ class s2agc:
         season_end = datetime.fromisoformat(end_date)
 
         bbox = gdf_to_bbox(fields)
-        items = self.source.search_items(bbox, start_date, end_date, limit=stac_limit)
+        search_kwargs: Dict[str, Any] = {"limit": stac_limit}
+        if snapshot_strategy == "top_n_cloudfree" and n_snapshots > 0:
+            # Let the STAC API sort by cloud cover and return only the N
+            # least cloudy items, instead of fetching `stac_limit` items
+            search_kwargs = {"limit": min(stac_limit, n_snapshots), "sortby": CLOUD_COVER_ASC}
+        # Datetimes / cloud cover are parsed once, when a strategy needs them
+        items = SortedItems(self.source.search_items(bbox, start_date, end_date, **search_kwargs))
         if not items:
             raise RuntimeError("No Sentinel-2 items found for given area/date range.")
 
@@ -136,87 +164,135 @@ class s2agc:
             sample_assets = chosen_items[0]["assets"]
             bands = sorted([k for k in sample_assets.keys() if k.startswith("B")])
 
-        feature_rows: List[Dict[str, Any]] = []
-        band_rows: List[Dict[str, Any]] = []
+        # Precompute time fractions for chosen items, reusing the datetimes
+        # parsed for selection (UTC, kept naive as the season bounds are)
+        dts = pd.DatetimeIndex(items.datetimes(chosen_items))
+        dur = season_end - season_start
+        if dur.total_seconds() > 0:
+            fracs = np.clip(((dts - season_start) / dur).to_numpy(dtype=np.float64), 0.0, 1.0)
+        else:
+            fracs = np.zeros(len(chosen_items))
 
-        # Precompute time fractions for chosen items
-        dur = (season_end - season_start).total_seconds()
-        item_meta = []
-        for it in chosen_items:
-            dt = datetime.fromisoformat(it["properties"]["datetime"].replace("Z", ""))
-            frac = (dt - season_start).total_seconds() / dur if dur > 0 else 0.0
-            frac = float(np.clip(frac, 0.0, 1.0))
-            item_meta.append((it, dt, frac))
+        # Stage of each snapshot, shared by all fields ("other" if none)
+        stage_names = list(DEFAULT_STAGE_BOUNDS.keys())
+        stages = [
+            stage_names[s] if s >= 0 else "other"
+            for s in stage_indices_for_fractions(fracs, DEFAULT_STAGE_BOUNDS)
+        ]
+        item_meta = list(zip(chosen_items, dts.to_pydatetime().tolist(), fracs.tolist(), stages))
 
-        for _, field in tqdm(fields.iterrows(), total=len(fields), desc="Fields"):
-            field_id = field[field_id_col]
-            geom = field.geometry
+        field_ids = fields[field_id_col].to_numpy()
+        geoms = fields.geometry.to_numpy()
+        # Field geometries projected per raster CRS, shared by all items
+        geom_cache: Dict[Any, List[dict]] = {}
+        # compute_indices buffer pool per worker thread
+        thread_buffers = threading.local()
 
-            index_time_series: Dict[str, List[Dict[str, Any]]] = {idx: [] for idx in indices}
+        def _process_item(it, dt, frac) -> List[Optional[Tuple[Dict[str, np.ndarray], Optional[Dict[str, Any]]]]]:
+            # Returns one entry per field: None if the field is not covered by
+            # this item, else (index arrays, optional per-band stats row).
+            # Index arrays are only cropped when features are requested.
+            assets = it["assets"]
+            band_hrefs: Dict[str, str] = {}
+            for b in bands:
+                if b in assets:
+                    band_hrefs[b] = assets[b]["href"]
 
-            for it, dt, frac in item_meta:
-                assets = it["assets"]
-                band_hrefs: Dict[str, str] = {}
-                for b in bands:
-                    if b in assets:
-                        band_hrefs[b] = assets[b]["href"]
+            if not band_hrefs:
+                return [None] * len(field_ids)
 
-                if not band_hrefs:
-                    continue
+            # Read every band once per window of nearby fields
+            windows = read_item_windows(band_hrefs, geoms, geom_cache=geom_cache, io_pool=io_pool)
 
-                # Clip raster bands to field geometry
-                band_arrays = clip_raster_to_geom(asset_href=None, geom=geom, bands=band_hrefs)
+            # Compute indices once per window; per-field arrays are cropped
+            # copies, so the window buffers are recycled by the next window
+            # handled on this thread.
+            if not hasattr(thread_buffers, "pool"):
+                thread_buffers.pool = {}
 
-                # If no overlap (empty dict), skip this snapshot for this field
-                if not band_arrays:
-                    continue
+            # Fields not covered by this item stay None
+            item_out: List[Optional[Tuple[Dict[str, np.ndarray], Optional[Dict[str, Any]]]]] = [None] * len(field_ids)
+            for tile_bands, crops in windows:
+                tile_indices = compute_indices(tile_bands, out=thread_buffers.pool)
 
-                # Compute indices
-                idx_arrays = compute_indices(band_arrays)
+                for i, crop in crops.items():
+                    idx_arrays: Dict[str, np.ndarray] = {}
+                    if return_mode in ("features", "both"):
+                        idx_arrays = {
+                            idx_name: crop_to_geom(tile_indices[idx_name], crop)
+                            for idx_name in indices
+                            if idx_name in tile_indices
+                        }
 
-                # Fill index time series (for aggregated features)
-                for idx_name in indices:
-                    if idx_name not in idx_arrays:
-                        continue
-                    index_time_series[idx_name].append(
-                        {
+                    # Optional: per-band stats
+                    stats_row: Optional[Dict[str, Any]] = None
+                    if return_mode in ("bands", "both"):
+                        stats_row = {
+                            "field_id": field_ids[i],
                             "datetime": dt,
                             "fraction": frac,
-                            "array": idx_arrays[idx_name],
                         }
-                    )
-
-                # Optional: per-band stats
-                if return_mode in ("bands", "both"):
-                    stats_row: Dict[str, Any] = {
-                        "field_id": field_id,
-                        "datetime": dt,
-                        "fraction": frac,
-                    }
-                    for band_code, arr in band_arrays.items():
-                        flat = arr.ravel()
-                        flat = flat[np.isfinite(flat)]
-                        if flat.size == 0:
-                            continue
-                        stats_row[f"{band_code}_mean"] = float(np.nanmean(flat))
-                        stats_row[f"{band_code}_median"] = float(np.nanmedian(flat))
-                        stats_row[f"{band_code}_min"] = float(np.nanmin(flat))
-                        stats_row[f"{band_code}_max"] = float(np.nanmax(flat))
-                        stats_row[f"{band_code}_std"] = float(np.nanstd(flat))
-                        stats_row[f"{band_code}_p10"] = float(np.nanpercentile(flat, 10))
-                        stats_row[f"{band_code}_p90"] = float(np.nanpercentile(flat, 90))
-
-                    band_rows.append(stats_row)
+                        for band_code, arr in tile_bands.items():
+                            for stat, val in summarize_band(crop_to_geom(arr, crop)).items():
+                                stats_row[f"{band_code}_{stat}"] = val
+
+                    item_out[i] = (idx_arrays, stats_row)
+            return item_out
+
+        # ------------------------------
+        # Per-snapshot processing
+        # ------------------------------
+        # Each item's band rasters are read once per window of nearby fields.
+        # Items are independent and dominated by raster IO (which releases the
+        # GIL), so they run on a thread pool. Each finished item is folded
+        # into per-field running time means and then dropped, so memory does
+        # not grow with the number of snapshots.
+        time_means: List[TimeMeanState] = [{} for _ in field_ids]
+        # per field: snapshot position -> per-band stats row
+        band_rows_by_field: List[Dict[int, Dict[str, Any]]] = [{} for _ in field_ids]
+
+        if max_workers is None:
+            max_workers = DEFAULT_MAX_WORKERS
+
+        with ThreadPoolExecutor(max_workers=DEFAULT_IO_WORKERS) as io_pool, \
+                ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(_process_item, it, dt, frac): j
+                for j, (it, dt, frac, _) in enumerate(item_meta)
+            }
+            for fut in tqdm(as_completed(futures), total=len(futures), desc="Snapshots"):
+                j = futures.pop(fut)
+                stage = item_meta[j][3]
+                for i, field_out in enumerate(fut.result()):
+                    if field_out is None:
+                        continue
+                    idx_arrays, stats_row = field_out
+
+                    # Fill running index time means (for aggregated features)
+                    if return_mode in ("features", "both") and stage != "other":
+                        for idx_name, arr in idx_arrays.items():
+                            add_to_time_mean(time_means[i], idx_name, stage, arr)
+
+                    if stats_row is not None:
+                        band_rows_by_field[i][j] = stats_row
+
+        feature_rows: List[Dict[str, Any]] = []
+        band_rows: List[Dict[str, Any]] = []
+
+        for i, field_id in enumerate(field_ids):
+            band_rows.extend(row for _, row in sorted(band_rows_by_field[i].items()))
 
             # Aggregate per field for index-based features
             if return_mode in ("features", "both"):
-                series = aggregate_field_indices(
+                row = aggregate_field_time_means(
                     field_id=field_id,
-                    index_time_series=index_time_series,
+                    time_means=time_means[i],
+                    index_names=indices,
                     season_start=season_start,
                     season_end=season_end,
                 )
-                feature_rows.append(series)
+                time_means[i] = {}
+                feature_rows.append(row)
 
         features_df = pd.DataFrame(feature_rows) if feature_rows and return_mode in ("features", "both") else pd.DataFrame()
         bands_df = pd.DataFrame(band_rows) if band_rows and return_mode in ("bands", "both") else pd.DataFrame()
@@ -31,3 +31,9 @@ DEFAULT_STAGE_BOUNDS = {
     "mid":    (0.33, 0.66),
     "late":   (0.66, 1.01),
 }
+
+# Concurrency of get_features: snapshots processed at once, and threads
+# shared by all of them for remote band opens/reads (caps the number of
+# concurrent requests to the data host).
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_IO_WORKERS = 8
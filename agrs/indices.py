@@ -1,14 +1,57 @@
-from typing import Dict
+from typing import Dict, Optional, Tuple
 import numpy as np
 
-def _safe_divide(num: np.ndarray, den: np.ndarray) -> np.ndarray:
-    """Elementwise division with NaN on invalid/zero."""
+def _safe_divide(num: np.ndarray, den: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+    """
+    Elementwise division with NaN on invalid/zero.
+
+    ``out`` may be the numerator itself when it is a float temporary, so the
+    quotient is written in place instead of into a fresh array.
+    """
     with np.errstate(divide="ignore", invalid="ignore"):
-        out = np.true_divide(num, den)
-        out[~np.isfinite(out)] = np.nan
+        out = np.divide(num, den, out=out)
+    out[~np.isfinite(out)] = np.nan
     return out
 
-def compute_indices(bands: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+def _buffer(
+    out: Optional[Dict[str, np.ndarray]],
+    name: str,
+    shape: Tuple[int, ...],
+) -> np.ndarray:
+    """
+    Float32 work array `name` from the buffer pool `out`.
+
+    Without a pool a fresh array is returned; otherwise the pooled array is
+    reused, and (re)allocated on first use or when the shape changes.
+    """
+    if out is None:
+        return np.empty(shape, dtype=np.float32)
+    buf = out.get(name)
+    if buf is None or buf.shape != shape:
+        buf = np.empty(shape, dtype=np.float32)
+        out[name] = buf
+    return buf
+
+def _normalized_difference(
+    a: np.ndarray,
+    b: np.ndarray,
+    out: Optional[Dict[str, np.ndarray]],
+    name: str,
+) -> np.ndarray:
+    """(a - b) / (a + b), written into the pooled buffer `name`."""
+    num = np.subtract(a, b, out=_buffer(out, name, a.shape))
+    den = np.add(a, b, out=_buffer(out, "_den", a.shape))
+    return _safe_divide(num, den, out=num)
+
+def _get_band(bands: Dict[str, np.ndarray], code: str) -> Optional[np.ndarray]:
+    """Fetch a band as float32 (no copy if it already is), or None."""
+    arr = bands.get(code)
+    return None if arr is None else np.asarray(arr, dtype=np.float32)
+
+def compute_indices(
+    bands: Dict[str, np.ndarray],
+    out: Optional[Dict[str, np.ndarray]] = None,
+) -> Dict[str, np.ndarray]:
     """
     Compute a suite of classic RS indices from Sentinel-2 bands.
 
@@ -16,134 +59,176 @@ def compute_indices(bands: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
     ----------
     bands : dict
         Mapping band_code -> array (e.g. "B02", "B03", ..., "B12").
+        Bands are cast to float32 once; reflectance needs no more precision.
+    out : dict, optional
+        Buffer pool reused across calls (e.g. snapshots of one field). Index
+        arrays and scratch terms are written into its arrays instead of
+        being allocated, so the returned arrays are overwritten by the next
+        call with the same pool; pop any array that must be kept.
 
     Returns
     -------
     dict
-        Mapping index_name -> array. Only indices whose required
+        Mapping index_name -> float32 array. Only indices whose required
         bands are present are returned.
     """
-    out: Dict[str, np.ndarray] = {}
-
-    B01 = bands.get("B01")  # Aerosol / coastal
-    B02 = bands.get("B02")  # Blue
-    B03 = bands.get("B03")  # Green
-    B04 = bands.get("B04")  # Red
-    B05 = bands.get("B05")  # RE1
-    B06 = bands.get("B06")  # RE2
-    B07 = bands.get("B07")  # RE3
-    B08 = bands.get("B08")  # NIR
-    B8A = bands.get("B8A")  # Narrow NIR
-    B11 = bands.get("B11")  # SWIR1
-    B12 = bands.get("B12")  # SWIR2
+    result: Dict[str, np.ndarray] = {}
+
+    B01 = _get_band(bands, "B01")  # Aerosol / coastal
+    B02 = _get_band(bands, "B02")  # Blue
+    B03 = _get_band(bands, "B03")  # Green
+    B04 = _get_band(bands, "B04")  # Red
+    B05 = _get_band(bands, "B05")  # RE1
+    B06 = _get_band(bands, "B06")  # RE2
+    B07 = _get_band(bands, "B07")  # RE3
+    B08 = _get_band(bands, "B08")  # NIR
+    B8A = _get_band(bands, "B8A")  # Narrow NIR
+    B11 = _get_band(bands, "B11")  # SWIR1
+    B12 = _get_band(bands, "B12")  # SWIR2
 
     # Helper: choose best NIR variant available
     NIR = B08 if B08 is not None else (B8A if B8A is not None else None)
 
+    # NIR/Red terms are shared by most vegetation indices: compute them once
+    # and write every temporary into a (pooled) buffer to keep the number of
+    # full raster passes and allocations per snapshot low. Python float
+    # constants do not upcast the float32 arrays.
+    nir_red_diff = nir_red_sum = None
+    if NIR is not None and B04 is not None:
+        shape = NIR.shape
+        nir_red_diff = np.subtract(NIR, B04, out=_buffer(out, "_nir_red_diff", shape))
+        nir_red_sum = np.add(NIR, B04, out=_buffer(out, "_nir_red_sum", shape))
+
     # --- Vegetation indices ---
 
     # NDVI = (NIR - Red) / (NIR + Red)
-    if NIR is not None and B04 is not None:
-        out["NDVI"] = _safe_divide(NIR - B04, NIR + B04)
+    if nir_red_diff is not None:
+        result["NDVI"] = _safe_divide(nir_red_diff, nir_red_sum, out=_buffer(out, "NDVI", shape))
 
     # EVI (3-band version) (Huete 2002)
     # EVI = 2.5 * (NIR - Red) / (NIR + 6*Red - 7.5*Blue + 1)
-    if NIR is not None and B04 is not None and B02 is not None:
-        out["EVI"] = _safe_divide(
-            2.5 * (NIR - B04),
-            (NIR + 6.0 * B04 - 7.5 * B02 + 1.0),
-        )
+    if nir_red_diff is not None and B02 is not None:
+        den = np.multiply(B04, 6.0, out=_buffer(out, "EVI", shape))
+        den += NIR
+        den -= np.multiply(B02, 7.5, out=_buffer(out, "_tmp", shape))
+        den += 1.0
+        num = np.multiply(nir_red_diff, 2.5, out=_buffer(out, "_tmp", shape))
+        result["EVI"] = _safe_divide(num, den, out=den)
 
     # EVI2 (2-band version, Jiang 2008)
     # EVI2 = 2.5 * (NIR - Red) / (NIR + 2.4*Red + 1)
-    if NIR is not None and B04 is not None:
-        out["EVI2"] = _safe_divide(
-            2.5 * (NIR - B04),
-            (NIR + 2.4 * B04 + 1.0),
-        )
+    if nir_red_diff is not None:
+        den = np.multiply(B04, 2.4, out=_buffer(out, "EVI2", shape))
+        den += NIR
+        den += 1.0
+        num = np.multiply(nir_red_diff, 2.5, out=_buffer(out, "_tmp", shape))
+        result["EVI2"] = _safe_divide(num, den, out=den)
 
     # SAVI (L=0.5)
     # SAVI = (1 + L) * (NIR - Red) / (NIR + Red + L)
-    if NIR is not None and B04 is not None:
+    if nir_red_diff is not None:
         L = 0.5
-        out["SAVI"] = _safe_divide(
-            (1.0 + L) * (NIR - B04),
-            (NIR + B04 + L),
-        )
+        den = np.add(nir_red_sum, L, out=_buffer(out, "SAVI", shape))
+        num = np.multiply(nir_red_diff, 1.0 + L, out=_buffer(out, "_tmp", shape))
+        result["SAVI"] = _safe_divide(num, den, out=den)
 
     # MSAVI (Qi 1994)
-    if NIR is not None and B04 is not None:
-        out["MSAVI"] = 0.5 * (
-            2.0 * NIR + 1.0 - np.sqrt((2.0 * NIR + 1.0) ** 2 - 8.0 * (NIR - B04))
-        )
+    # MSAVI = 0.5 * (2*NIR + 1 - sqrt((2*NIR + 1)^2 - 8*(NIR - Red)))
+    # evaluated as 4*(NIR - Red) / (2*NIR + 1 + sqrt(...)), which avoids the
+    # float32 cancellation of subtracting two nearly equal large terms.
+    if nir_red_diff is not None:
+        a = np.multiply(NIR, 2.0, out=_buffer(out, "_tmp", shape))
+        a += 1.0
+        root = np.multiply(a, a, out=_buffer(out, "MSAVI", shape))
+        root -= np.multiply(nir_red_diff, 8.0, out=_buffer(out, "_tmp2", shape))
+        np.sqrt(root, out=root)
+        root += a
+        num = np.multiply(nir_red_diff, 4.0, out=a)
+        result["MSAVI"] = _safe_divide(num, root, out=root)
 
     # OSAVI (Rondeaux 1996), L=0.16
-    if NIR is not None and B04 is not None:
+    if nir_red_diff is not None:
         L = 0.16
-        out["OSAVI"] = _safe_divide(
-            (NIR - B04),
-            (NIR + B04 + L),
-        )
+        den = np.add(nir_red_sum, L, out=_buffer(out, "OSAVI", shape))
+        result["OSAVI"] = _safe_divide(nir_red_diff, den, out=den)
 
     # GNDVI = (NIR - Green) / (NIR + Green)
     if NIR is not None and B03 is not None:
-        out["GNDVI"] = _safe_divide(NIR - B03, NIR + B03)
+        result["GNDVI"] = _normalized_difference(NIR, B03, out, "GNDVI")
 
     # VARI = (Green - Red) / (Green + Red - Blue)
     if B03 is not None and B04 is not None and B02 is not None:
-        out["VARI"] = _safe_divide(
-            B03 - B04,
-            B03 + B04 - B02,
-        )
+        den = np.add(B03, B04, out=_buffer(out, "VARI", B03.shape))
+        den -= B02
+        num = np.subtract(B03, B04, out=_buffer(out, "_tmp", B03.shape))
+        result["VARI"] = _safe_divide(num, den, out=den)
 
     # GCI = (NIR / Green) - 1
     if NIR is not None and B03 is not None:
-        out["GCI"] = _safe_divide(NIR, B03) - 1.0
+        gci = _safe_divide(NIR, B03, out=_buffer(out, "GCI", NIR.shape))
+        gci -= 1.0
+        result["GCI"] = gci
 
     # NDRE = (NIR - RE) / (NIR + RE) (use B08/B8A and B05/B06/B07)
     RE = B05 if B05 is not None else (B06 if B06 is not None else B07)
     if NIR is not None and RE is not None:
-        out["NDRE"] = _safe_divide(NIR - RE, NIR + RE)
+        result["NDRE"] = _normalized_difference(NIR, RE, out, "NDRE")
 
     # RECI = (NIR / RE) - 1
     if NIR is not None and RE is not None:
-        out["RECI"] = _safe_divide(NIR, RE) - 1.0
+        reci = _safe_divide(NIR, RE, out=_buffer(out, "RECI", NIR.shape))
+        reci -= 1.0
+        result["RECI"] = reci
 
     # ARVI = (NIR - (2*Red - Blue)) / (NIR + (2*Red - Blue))
     if NIR is not None and B04 is not None and B02 is not None:
-        rb = 2.0 * B04 - B02
-        out["ARVI"] = _safe_divide(NIR - rb, NIR + rb)
+        rb = np.multiply(B04, 2.0, out=_buffer(out, "_tmp", NIR.shape))
+        rb -= B02
+        num = np.subtract(NIR, rb, out=_buffer(out, "ARVI", NIR.shape))
+        rb += NIR
+        result["ARVI"] = _safe_divide(num, rb, out=num)
 
     # MCARI (Daughtry 2000)
     # MCARI = ((RE - Red) - 0.2*(RE - Green)) * (RE / Red)
     if RE is not None and B04 is not None and B03 is not None:
-        mcari_num = (RE - B04) - 0.2 * (RE - B03)
-        out["MCARI"] = mcari_num * _safe_divide(RE, B04)
+        mcari = _safe_divide(RE, B04, out=_buffer(out, "MCARI", RE.shape))
+        term = np.subtract(RE, B04, out=_buffer(out, "_tmp", RE.shape))
+        re_green = np.subtract(RE, B03, out=_buffer(out, "_tmp2", RE.shape))
+        re_green *= 0.2
+        term -= re_green
+        mcari *= term
+        result["MCARI"] = mcari
 
     # MCARI2 (Haboudane 2004)
-    if "MCARI" in out and "OSAVI" in out:
-        out["MCARI2"] = out["MCARI"] * _safe_divide(out["OSAVI"], out["OSAVI"] + 0.08)
+    if "MCARI" in result and "OSAVI" in result:
+        osavi = result["OSAVI"]
+        den = np.add(osavi, 0.08, out=_buffer(out, "MCARI2", osavi.shape))
+        mcari2 = _safe_divide(osavi, den, out=den)
+        mcari2 *= result["MCARI"]
+        result["MCARI2"] = mcari2
 
     # --- Water / moisture / burn indices ---
 
     # NDWI (McFeeters) = (Green - NIR) / (Green + NIR)
-    if NIR is not None and B03 is not None:
-        out["NDWI"] = _safe_divide(B03 - NIR, B03 + NIR)
+    # This is exactly -GNDVI, so negate it instead of dividing again.
+    if "GNDVI" in result:
+        gndvi = result["GNDVI"]
+        result["NDWI"] = np.negative(gndvi, out=_buffer(out, "NDWI", gndvi.shape))
 
     # MNDWI (Xu) = (Green - SWIR1) / (Green + SWIR1)
     if B03 is not None and B11 is not None:
-        out["MNDWI"] = _safe_divide(B03 - B11, B03 + B11)
+        result["MNDWI"] = _normalized_difference(B03, B11, out, "MNDWI")
 
     # NDMI (a.k.a. NDWI-Gao) = (NIR - SWIR1) / (NIR + SWIR1)
     if NIR is not None and B11 is not None:
-        out["NDMI"] = _safe_divide(NIR - B11, NIR + B11)
+        result["NDMI"] = _normalized_difference(NIR, B11, out, "NDMI")
 
     # NBR  = (NIR - SWIR2) / (NIR + SWIR2)
     if NIR is not None and B12 is not None:
-        out["NBR"] = _safe_divide(NIR - B12, NIR + B12)
+        result["NBR"] = _normalized_difference(NIR, B12, out, "NBR")
 
     # NBR2 = (SWIR1 - SWIR2) / (SWIR1 + SWIR2)
     if B11 is not None and B12 is not None:
-        out["NBR2"] = _safe_divide(B11 - B12, B11 + B12)
+        result["NBR2"] = _normalized_difference(B11, B12, out, "NBR2")
 
-    return out
+    return result
@@ -1,19 +1,125 @@
 from __future__ import annotations
-from typing import List, Sequence, Mapping, Any
+from typing import Dict, List, Sequence, Mapping, Any, Tuple, Union
+from dataclasses import dataclass
 from datetime import datetime, timedelta
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
 
 
 Item = Mapping[str, Any]
 
 
-def _item_datetime(item: Item) -> datetime:
-    dt_str = item["properties"]["datetime"]
-    # Planetary Computer returns ISO timestamps with "Z"
-    return datetime.fromisoformat(dt_str.replace("Z", ""))
+def _datetime64(dates: Sequence[datetime]) -> np.ndarray:
+    """Naive datetimes as a datetime64[us] array (exact, integer-backed)."""
+    return np.array(dates, dtype="datetime64[us]")
+
+
+def _sorted_by_time(items: Sequence[Item]) -> Tuple[List[Item], np.ndarray]:
+    """
+    Items sorted by datetime (stable), with their datetimes as a
+    datetime64[us] array; all datetimes are parsed in one vectorized call.
+    Planetary Computer returns ISO timestamps with "Z": they are read as
+    UTC and kept naive, matching the naive season bounds.
+    """
+    parsed = pd.to_datetime(
+        [it["properties"]["datetime"] for it in items],
+        format="ISO8601",
+        utc=True,
+        cache=True,
+    )
+    ts = parsed.as_unit("us").tz_localize(None).to_numpy()
+    order = np.argsort(ts, kind="stable")
+    return [items[i] for i in order], ts[order]
+
+
+@dataclass(eq=False)
+class SortedItems:
+    """
+    STAC items (search order) with their datetimes and cloud cover parsed
+    at most once, on first use, and kept for later selection calls.
+
+    Every `select_*` function accepts either a plain item list or a
+    SortedItems; build one after a search and pass it to several
+    strategies to sort and parse the items only once.
+    """
+
+    items: List[Item]
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __getitem__(self, i):
+        return self.items[i]
+
+    @cached_property
+    def _by_time(self) -> Tuple[List[Item], np.ndarray]:
+        return _sorted_by_time(self.items)
+
+    @property
+    def items_sorted(self) -> List[Item]:
+        """Items sorted by datetime (stable)."""
+        return self._by_time[0]
+
+    @property
+    def ts(self) -> np.ndarray:
+        """Datetimes of `items_sorted`, datetime64[us]."""
+        return self._by_time[1]
+
+    @cached_property
+    def _time_pos(self) -> Dict[int, int]:
+        return {id(it): k for k, it in enumerate(self.items_sorted)}
+
+    def datetimes(self, chosen: Sequence[Item]) -> np.ndarray:
+        """
+        Datetimes (datetime64[us]) of `chosen`, items of this SortedItems
+        (e.g. a selection result), from the already parsed `ts`.
+        """
+        pos = self._time_pos
+        return self.ts[[pos[id(it)] for it in chosen]]
+
+    @cached_property
+    def cloud(self) -> np.ndarray:
+        """eo:cloud_cover of `items` (0 if missing), float64."""
+        return np.fromiter(
+            (it["properties"].get("eo:cloud_cover", 0.0) for it in self.items),
+            dtype=np.float64,
+            count=len(self.items),
+        )
+
+
+Items = Union[Sequence[Item], SortedItems]
+
+
+def _as_sorted(items: Items) -> SortedItems:
+    return items if isinstance(items, SortedItems) else SortedItems(list(items))
+
+
+def _nearest_indices(ts: np.ndarray, targets: np.ndarray) -> np.ndarray:
+    """
+    Position of the nearest value in the sorted array `ts` for each target,
+    by binary search. Ties go to the earliest position, as with argmin.
+    With datetime64 inputs all distances are exact integer differences.
+    """
+    right = np.searchsorted(ts, targets, side="left").clip(0, len(ts) - 1)
+    left = (right - 1).clip(0, None)
+    take_left = np.abs(targets - ts[left]) <= np.abs(ts[right] - targets)
+    nearest = np.where(take_left, left, right)
+    # first occurrence of the nearest value among duplicate timestamps
+    return np.searchsorted(ts, ts[nearest], side="left")
+
+
+def _unique_in_order(idxs: np.ndarray) -> List[int]:
+    """Drop repeated positions, keeping the first occurrence of each."""
+    return list(dict.fromkeys(idxs.tolist()))
 
 
 def select_snapshots_fractional(
-    items: Sequence[Item],
+    items: Items,
     season_start: datetime,
     season_end: datetime,
     fractions: Sequence[float],
@@ -24,65 +130,48 @@ def select_snapshots_fractional(
     if not items:
         return []
 
-    items_sorted = sorted(items, key=_item_datetime)
-    dur = (season_end - season_start).total_seconds()
-
-    chosen: List[Item] = []
-    used_idxs = set()
-
-    for f in fractions:
-        f = float(max(0.0, min(1.0, f)))
-        target_dt = season_start + timedelta(seconds=f * dur)
-
-        best_idx = None
-        best_dt_diff = None
-        for i, it in enumerate(items_sorted):
-            dt = _item_datetime(it)
-            diff = abs((dt - target_dt).total_seconds())
-            if best_dt_diff is None or diff < best_dt_diff:
-                best_dt_diff = diff
-                best_idx = i
+    items = _as_sorted(items)
+    items_sorted, ts = items.items_sorted, items.ts
+    dur_us = (season_end - season_start) // timedelta(microseconds=1)
 
-        if best_idx is not None and best_idx not in used_idxs:
-            used_idxs.add(best_idx)
-            chosen.append(items_sorted[best_idx])
+    fracs = np.clip(np.asarray(fractions, dtype=np.float64), 0.0, 1.0)
+    offsets = np.round(fracs * dur_us).astype("timedelta64[us]")
+    idxs = _nearest_indices(ts, _datetime64([season_start]) + offsets)
+    return [items_sorted[i] for i in _unique_in_order(idxs)]
 
-    return chosen
 
-
-def select_snapshot_fixed_date(items: Sequence[Item], target_dt: datetime) -> Item | None:
+def select_snapshot_fixed_date(items: Items, target_dt: datetime) -> Item | None:
     """
     Single snapshot closest to a fixed target date.
     """
     if not items:
         return None
 
-    items_sorted = sorted(items, key=_item_datetime)
-    best_it = None
-    best_diff = None
-    for it in items_sorted:
-        dt = _item_datetime(it)
-        diff = abs((dt - target_dt).total_seconds())
-        if best_diff is None or diff < best_diff:
-            best_diff = diff
-            best_it = it
-    return best_it
+    items = _as_sorted(items)
+    items_sorted, ts = items.items_sorted, items.ts
+    idx = _nearest_indices(ts, _datetime64([target_dt]))[0]
+    return items_sorted[idx]
 
 
-def select_top_n_cloudfree(items: Sequence[Item], n: int) -> List[Item]:
+def select_top_n_cloudfree(items: Items, n: int) -> List[Item]:
     """
     Select N items with lowest cloud cover (eo:cloud_cover property if present).
     """
     if not items or n <= 0:
         return []
-    items_sorted = sorted(
-        items,
-        key=lambda it: it["properties"].get("eo:cloud_cover", 0.0),
-    )
-    return items_sorted[:n]
-
-
-def select_snapshots_all(items: Sequence[Item]) -> List[Item]:
+    items = _as_sorted(items)
+    cc = items.cloud
+    # O(N) partition to the n-th lowest cloud cover, then a stable sort of
+    # the candidates only, so ties keep search order as a full sort would
+    cand = np.arange(len(items))
+    if n < len(items):
+        kth = np.partition(cc, n - 1)[n - 1]
+        cand = np.flatnonzero(cc <= kth)
+    order = cand[np.argsort(cc[cand], kind="stable")][:n]
+    return [items[i] for i in order]
+
+
+def select_snapshots_all(items: Items) -> List[Item]:
     """
     Strategy 'all': use all items in the search window.
     """
@@ -90,7 +179,7 @@ def select_snapshots_all(items: Sequence[Item]) -> List[Item]:
 
 
 def select_snapshots_by_dates(
-    items: Sequence[Item],
+    items: Items,
     dates: Sequence[datetime],
 ) -> List[Item]:
     """
@@ -99,21 +188,7 @@ def select_snapshots_by_dates(
     if not items or not dates:
         return []
 
-    items_sorted = sorted(items, key=_item_datetime)
-    chosen: List[Item] = []
-    used_idxs = set()
-
-    for target_dt in dates:
-        best_idx = None
-        best_diff = None
-        for i, it in enumerate(items_sorted):
-            dt = _item_datetime(it)
-            diff = abs((dt - target_dt).total_seconds())
-            if best_diff is None or diff < best_diff:
-                best_diff = diff
-                best_idx = i
-        if best_idx is not None and best_idx not in used_idxs:
-            used_idxs.add(best_idx)
-            chosen.append(items_sorted[best_idx])
-
-    return chosen
+    items = _as_sorted(items)
+    items_sorted, ts = items.items_sorted, items.ts
+    idxs = _nearest_indices(ts, _datetime64(dates))
+    return [items_sorted[i] for i in _unique_in_order(idxs)]
@@ -1,10 +1,14 @@
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 
 import planetary_computer as pc
 from pystac_client import Client
 
 
+# STAC sort order putting the least cloudy items first
+CLOUD_COVER_ASC = [{"field": "properties.eo:cloud_cover", "direction": "asc"}]
+
+
 class PlanetaryComputerS2Source:
     """
     Minimal Sentinel-2 L2A source backed by Microsoft Planetary Computer.
@@ -29,11 +33,16 @@ class PlanetaryComputerS2Source:
         start_date: str,
         end_date: str,
         limit: int = 100,
+        sortby: Optional[List[Dict[str, str]]] = None,
     ) -> List[Dict[str, Any]]:
         """
         Search Sentinel-2 L2A items in Planetary Computer.
 
-        Returns a list of pystac Items converted to plain dicts.
+        `sortby` is passed to the STAC API (e.g. CLOUD_COVER_ASC), so the
+        server orders the results and `limit` keeps the first ones.
+
+        Returns a list of STAC items as plain dicts (signed hrefs), taken
+        straight from the API responses without building pystac Items.
         """
         datetime_range = f"{start_date}/{end_date}"
 
@@ -42,6 +51,7 @@ class PlanetaryComputerS2Source:
             bbox=bbox,
             datetime=datetime_range,
             max_items=limit,
+            sortby=sortby,
             query={
                 "eo:cloud_cover": {
                     "lt": self.max_cloud * 100.0
@@ -49,5 +59,4 @@ class PlanetaryComputerS2Source:
             },
         )
 
-        items = list(search.get_items())
-        return [item.to_dict() for item in items]
+        return list(search.items_as_dicts())
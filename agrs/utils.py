@@ -1,19 +1,42 @@
-from typing import Tuple, Dict
+from concurrent.futures import Executor, ThreadPoolExecutor, wait
+from contextlib import ExitStack
+from typing import Tuple, Dict, List, Optional, Sequence, Set
 
 from shapely.geometry import mapping
 import geopandas as gpd
 import rasterio
-from rasterio.mask import mask
+from rasterio.crs import CRS
+from rasterio.enums import Resampling
+from rasterio.errors import WindowError
+from rasterio.features import geometry_mask, geometry_window
 from rasterio.warp import transform_geom
+from rasterio.windows import Window, bounds as window_bounds, from_bounds, transform as window_transform
 import numpy as np
 
 
+# GDAL options for reading cloud-hosted COGs: HTTP/2 multiplexing of the
+# concurrent band requests, and in-memory caching of fetched blocks.
+_GDAL_HTTP_OPTIONS = {
+    "GDAL_HTTP_MULTIPLEX": "YES",
+    "GDAL_HTTP_VERSION": "2",
+    "VSI_CACHE": "TRUE",
+    "CPL_VSIL_CURL_ALLOWED_EXTENSIONS": ".tif",
+}
+
+_WGS84 = CRS.from_epsg(4326)
+
+# Per-geometry crop of an item window: (row slice, col slice, outside mask),
+# where the mask is True for pixels of the crop outside the geometry, or None
+# if the geometry covers the whole crop.
+GeomCrop = Tuple[slice, slice, Optional[np.ndarray]]
+
+
 def gdf_to_bbox(gdf: gpd.GeoDataFrame) -> Tuple[float, float, float, float]:
     """
     Convert a GeoDataFrame to a bounding box tuple (minx, miny, maxx, maxy).
     """
-    bounds = gdf.total_bounds  # minx, miny, maxx, maxy
-    return tuple(bounds.tolist())
+    b = gdf.total_bounds  # minx, miny, maxx, maxy
+    return (float(b[0]), float(b[1]), float(b[2]), float(b[3]))
 
 
 def clip_raster_to_geom(
@@ -36,30 +59,250 @@ def clip_raster_to_geom(
     Returns
     -------
     dict
-        Mapping band_code -> clipped numpy array (H, W).
+        Mapping band_code -> clipped float32 array (H, W) on the grid of the
+        finest band; pixels outside the geometry are NaN.
         If geometry does not overlap any band raster, returns {}.
     """
-    out: Dict[str, np.ndarray] = {}
+    return clip_item_to_geoms(bands, [geom])[0]
+
+
+# Cell size (pixels) of the coarse grid used to find nearby window groups.
+_GROUP_CELL = 256
+
+
+def _cells(r0: int, c0: int, r1: int, c1: int):
+    """Grid cells overlapped by the pixel box [r0, r1) x [c0, c1)."""
+    for cr in range(r0 // _GROUP_CELL, (r1 - 1) // _GROUP_CELL + 1):
+        for cc in range(c0 // _GROUP_CELL, (c1 - 1) // _GROUP_CELL + 1):
+            yield cr, cc
+
+
+def _group_windows(windows: List[Window], max_overhead: float) -> List[List[int]]:
+    """
+    Greedily group windows so that each group's bounding window covers at
+    most `max_overhead` times the summed area of its members.
+
+    A window is only tested against groups whose box comes within one
+    window size of it (looked up in a coarse grid of `_GROUP_CELL` pixel
+    cells), earliest group first, so each window checks a bounded number
+    of candidates instead of every group.
+    """
+    groups: List[Tuple[List[int], List[int], int]] = []  # members, [r0, c0, r1, c1], area
+    grid: Dict[Tuple[int, int], Set[int]] = {}
+    for i, w in enumerate(windows):
+        r0, c0 = int(w.row_off), int(w.col_off)
+        r1, c1 = r0 + max(int(w.height), 1), c0 + max(int(w.width), 1)
+        area = (r1 - r0) * (c1 - c0)
+        reach = max(r1 - r0, c1 - c0)
+        candidates = set()
+        for cell in _cells(r0 - reach, c0 - reach, r1 + reach, c1 + reach):
+            candidates.update(grid.get(cell, ()))
+
+        for g in sorted(candidates):
+            members, box, area_sum = groups[g]
+            ur0, uc0 = min(box[0], r0), min(box[1], c0)
+            ur1, uc1 = max(box[2], r1), max(box[3], c1)
+            if (ur1 - ur0) * (uc1 - uc0) <= max_overhead * (area_sum + area):
+                members.append(i)
+                groups[g] = (members, [ur0, uc0, ur1, uc1], area_sum + area)
+                old_cells = set(_cells(*box))
+                for cell in _cells(ur0, uc0, ur1, uc1):
+                    if cell not in old_cells:
+                        grid.setdefault(cell, set()).add(g)
+                break
+        else:
+            groups.append(([i], [r0, c0, r1, c1], area))
+            for cell in _cells(r0, c0, r1, c1):
+                grid.setdefault(cell, set()).add(len(groups) - 1)
+    return [members for members, _, _ in groups]
+
+
+def _project_geoms(geoms: Sequence, crs: Optional[CRS]) -> List[dict]:
+    """GeoJSON mappings of EPSG:4326 `geoms`, reprojected to `crs`."""
+    shapes = [mapping(geom) for geom in geoms]
+    if crs is None or crs == _WGS84:
+        return shapes
+    return [transform_geom(_WGS84, crs, shape) for shape in shapes]
 
-    for band_code, href in bands.items():
-        with rasterio.open(href) as src:
-            # Reproject geometry from EPSG:4326 to raster CRS if needed
-            geom_geojson = [mapping(geom)]
-            if src.crs is not None and src.crs.to_string() != "EPSG:4326":
-                geom_geojson = [
-                    transform_geom("EPSG:4326", src.crs, g) for g in geom_geojson
-                ]
 
+def _open_band(href: str):
+    # GDAL config options are thread-local, so set them in the worker too
+    with rasterio.Env(**_GDAL_HTTP_OPTIONS):
+        return rasterio.open(href)
+
+
+def _read_on_grid(src, ref_transform, window: Window, shape: Tuple[int, int]) -> np.ndarray:
+    """
+    Read band 1 of `src` over `window` of the reference grid as float32,
+    resampling with nearest neighbour if `src` is on another grid. GDAL
+    converts to float32 while filling the output, so no cast copy is made.
+    """
+    with rasterio.Env(**_GDAL_HTTP_OPTIONS):
+        if src.transform == ref_transform:
+            return src.read(1, window=window, out_dtype="float32")
+        win = from_bounds(*window_bounds(window, ref_transform), transform=src.transform)
+        return src.read(
+            1, window=win, out_shape=shape, resampling=Resampling.nearest, out_dtype="float32"
+        )
+
+
+def read_item_windows(
+    bands: Dict[str, str],
+    geoms: Sequence,
+    max_overhead: float = 4.0,
+    geom_cache: Optional[Dict[CRS, List[dict]]] = None,
+    io_pool: Optional[Executor] = None,
+) -> List[Tuple[Dict[str, np.ndarray], Dict[int, GeomCrop]]]:
+    """
+    Read the bands of one item for many geometries in a few batched windows.
+
+    Nearby geometries are grouped so that each group's bounding window
+    covers at most `max_overhead` times the pixels of its members; every
+    band is then read once per group (bands concurrently, on a thread pool),
+    on the pixel grid of the finest band
+    (coarser bands are resampled with nearest neighbour), so band arrays of
+    a group share one shape and indices can be computed for it at once.
+    Dense fields end up in a single window; scattered fields do not force a
+    read of the whole tile.
+
+    Parameters
+    ----------
+    bands : dict
+        Mapping band_code -> href for each band.
+    geoms : sequence of shapely geometries
+        Geometries in EPSG:4326 (WGS84).
+    max_overhead : float
+        Maximum ratio of a group's window area to its members' window areas.
+    geom_cache : dict, optional
+        Mapping CRS -> `geoms` projected to it, shared across calls with the
+        same `geoms` (e.g. items of one search) so each geometry is
+        reprojected once per CRS rather than once per item.
+    io_pool : Executor, optional
+        Pool running the band opens/reads. Share one bounded pool between
+        concurrent calls to cap the total number of remote requests; by
+        default a pool with one thread per band is used for this call.
+
+    Returns
+    -------
+    list of (dict, dict)
+        One entry per window: mapping band_code -> float32 array over the
+        window, and mapping geometry position in `geoms` -> crop (apply with
+        `crop_to_geom`). Geometries that do not overlap the rasters appear
+        in no window.
+    """
+    out: List[Tuple[Dict[str, np.ndarray], Dict[int, GeomCrop]]] = []
+    if not bands:
+        return out
+
+    with rasterio.Env(**_GDAL_HTTP_OPTIONS), ExitStack() as stack:
+        pool = io_pool
+        if pool is None:
+            pool = stack.enter_context(ThreadPoolExecutor(max_workers=max(len(bands), 1)))
+
+        # Each band is a separate remote file: open and read them concurrently
+        opens = [pool.submit(_open_band, href) for href in bands.values()]
+        wait(opens)
+        srcs = {}
+        for b, fut in zip(bands, opens):
+            if fut.exception() is None:
+                srcs[b] = stack.enter_context(fut.result())
+        for fut in opens:
+            fut.result()  # re-raise the first failed open; opened bands are closed
+        ref = min(srcs.values(), key=lambda src: abs(src.transform.a))
+
+        # Geometries in the raster CRS, projected once per CRS
+        if geom_cache is None:
+            projected = _project_geoms(geoms, ref.crs)
+        else:
+            projected = geom_cache.get(ref.crs)
+            if projected is None:
+                projected = geom_cache.setdefault(ref.crs, _project_geoms(geoms, ref.crs))
+
+        # Geometry windows on the reference grid, same rules as rasterio.mask
+        positions: List[int] = []
+        shapes: List[dict] = []
+        windows: List[Window] = []
+        for i, geom_geojson in enumerate(projected):
             try:
-                arr, _ = mask(src, geom_geojson, crop=True)
-            except ValueError as e:
-                # Shapes do not overlap raster: skip this item entirely
-                if "do not overlap raster" in str(e):
-                    return {}
-                else:
-                    raise
+                win = geometry_window(ref, [geom_geojson])
+            except WindowError:
+                continue
+            positions.append(i)
+            shapes.append(geom_geojson)
+            windows.append(win)
+
+        for group in _group_windows(windows, max_overhead):
+            row_off = min(int(windows[k].row_off) for k in group)
+            col_off = min(int(windows[k].col_off) for k in group)
+            row_stop = max(int(windows[k].row_off + windows[k].height) for k in group)
+            col_stop = max(int(windows[k].col_off + windows[k].width) for k in group)
+            union = Window(col_off, row_off, col_stop - col_off, row_stop - row_off)
+            union_shape = (int(union.height), int(union.width))
+
+            reads = [
+                pool.submit(_read_on_grid, src, ref.transform, union, union_shape)
+                for src in srcs.values()
+            ]
+            # wait for every read before a failure closes the datasets
+            wait(reads)
+            tile = {band_code: fut.result() for band_code, fut in zip(srcs, reads)}
+
+            crops: Dict[int, GeomCrop] = {}
+            for k in group:
+                win = windows[k]
+                r0 = int(win.row_off) - row_off
+                c0 = int(win.col_off) - col_off
+                h, w = int(win.height), int(win.width)
+                win_transform = window_transform(win, ref.transform)
+                outside = geometry_mask([shapes[k]], out_shape=(h, w), transform=win_transform)
+                if not outside.any():
+                    # field covers its whole window: nothing to blank per array
+                    outside = None
+                crops[positions[k]] = (slice(r0, r0 + h), slice(c0, c0 + w), outside)
+
+            out.append((tile, crops))
+
+    return out
+
+
+def crop_to_geom(arr: np.ndarray, crop: GeomCrop) -> np.ndarray:
+    """
+    Cut one geometry out of an item window array (see `read_item_windows`).
+
+    Returns a float copy with pixels outside the geometry set to NaN.
+    """
+    rows, cols, outside = crop
+    out = arr[rows, cols].copy()
+    if outside is not None:
+        out[outside] = np.nan
+    return out
 
-            # arr shape: (1, H, W)
-            out[band_code] = arr[0].astype("float32")
 
+def clip_item_to_geoms(
+    bands: Dict[str, str],
+    geoms: Sequence,
+) -> List[Dict[str, np.ndarray]]:
+    """
+    Clip the bands of one item to many geometries, with batched band reads.
+
+    Parameters
+    ----------
+    bands : dict
+        Mapping band_code -> href for each band.
+    geoms : sequence of shapely geometries
+        Geometries in EPSG:4326 (WGS84).
+
+    Returns
+    -------
+    list of dict
+        One mapping band_code -> clipped array per geometry, in the order of
+        `geoms` (pixels outside the geometry are NaN); {} for geometries that
+        do not overlap the rasters.
+    """
+    out: List[Dict[str, np.ndarray]] = [{} for _ in geoms]
+    if not bands:
+        return out
+    for tile, crops in read_item_windows(bands, geoms):
+        for i, crop in crops.items():
+            out[i] = {b: crop_to_geom(arr, crop) for b, arr in tile.items()}
     return out
@@ -18,7 +18,7 @@ setup(
     python_requires=">=3.9",
     install_requires=[
         "numpy",
-        "pandas",
+        "pandas>=2.0",
         "geopandas",
         "shapely",
         "rasterio",